@@ -1,43 +1,215 @@
-from flask import Flask, render_template
-from io import BytesIO
-import base64
+from flask import Flask, Response, abort, render_template, request, stream_with_context, url_for
+from markupsafe import escape
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import pathlib
+import threading
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import polars as pl
+from numba import njit, prange
 from sklearn.datasets import fetch_openml
 
 from ucimlrepo import fetch_ucirepo
 
+from plots import render_boxplot, render_correlation, render_histogram, render_pairs, to_ipc
+
+# Array module for the correlation matrix; setup() switches it to CuPy when
+# CuPy is installed and a CUDA device is available
+cp = None
+_xp = np
+
 app = Flask(__name__)
 
-# Fetch dataset using fetch_ucirepo
-breast_cancer_wisconsin_diagnostic = fetch_ucirepo(id=17)
+# The fetched dataset is cached on disk so restarts skip the download
+DATASET_CACHE = pathlib.Path.home() / ".cache/eda/bcw.parquet"
+TARGET_CACHE = pathlib.Path.home() / ".cache/eda/bcw_target.parquet"
+
+# Load features and targets from the Parquet cache, fetching them using
+# fetch_ucirepo on the first run
+def load_dataset():
+    if DATASET_CACHE.exists() and TARGET_CACHE.exists():
+        return pd.read_parquet(DATASET_CACHE, engine='pyarrow'), pd.read_parquet(TARGET_CACHE, engine='pyarrow')
+    breast_cancer_wisconsin_diagnostic = fetch_ucirepo(id=17)
+    features = pd.DataFrame(breast_cancer_wisconsin_diagnostic.data.features, columns=breast_cancer_wisconsin_diagnostic.feature_names)
+    targets = pd.DataFrame(breast_cancer_wisconsin_diagnostic.data.targets)
+    DATASET_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    features.to_parquet(DATASET_CACHE, engine='pyarrow')
+    targets.to_parquet(TARGET_CACHE, engine='pyarrow')
+    return features, targets
+
 X_no_outliers = None
 
-# Extract features and targets
-X = pd.DataFrame(breast_cancer_wisconsin_diagnostic.data.features, columns=breast_cancer_wisconsin_diagnostic.feature_names)
-y = pd.Series(breast_cancer_wisconsin_diagnostic.data.target, name='target', dtype='category')
+# Rendered figures keyed by "<route>:<data version>", plus the compression
+# level for PNGs; the version is bumped whenever X changes so stale figures
+# are never served
+_fig_cache: dict[str, bytes] = {}
+_data_version = [0]
+_outliers_version = [-1]
+
+# Numerical columns of X and their float32 array, rebuilt when X changes
+_X_num = [None]
+_X_num_arr = [None]
+_X_num_version = [-1]
+
+# Dataset state, filled in by setup()
+X = None
+y = None
+numerical_cols = None
+pair_cols = None
+
+# PNG compression level for the current request; zlib dominates savefig time,
+# so level 1 is used by default and ?fast=1 opts into 0 (no compression)
+def png_compress_level():
+    return 0 if request.args.get('fast') == '1' else 1
+
+# Pearson correlation matrix of the columns of arr, returned as numpy
+def fast_corr(arr):
+    a = _xp.asarray(arr, dtype=_xp.float32)
+    c = _xp.corrcoef(a, rowvar=False)
+    return cp.asnumpy(c) if _xp is cp else c
+
+# Rendering and encoding run in a pool of worker processes, each with its own
+# figure pool, so concurrent requests are not serialized on the GIL. Workers
+# come from a forkserver rather than being forked from this process, whose
+# Numba/TBB threads would not survive the fork, and the server preloads plots
+_mp_context = multiprocessing.get_context('forkserver')
+_pool = None
+_pool_lock = threading.Lock()
+
+def start_pool():
+    global _pool
+    _pool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1), mp_context=_mp_context)
+
+# X keeps its source precision; the frames sent to the workers are float32,
+# which is ample for plotting and halves the payload. A worker that dies
+# (e.g. killed for memory) breaks the whole pool, so the pool is replaced
+# and the render retried once rather than failing every later request
+def render(renderer, key, frame, *args):
+    payload = to_ipc(frame.astype(np.float32))
+    pool = _pool
+    try:
+        return pool.submit(renderer, key, payload, *args).result()
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                pool.shutdown(wait=False)
+                start_pool()
+        return _pool.submit(renderer, key, payload, *args).result()
+
+# Row mask of values whose z-score is below thr in every column, computed
+# in one fused pass per column with no intermediate arrays. A NaN z-score
+# (e.g. a constant column) fails the test, as it did with pandas, which is
+# why fastmath is not enabled. setup() compiles the kernel without running
+# it, so no Numba threads exist before the first request.
+@njit(parallel=True, cache=True)
+def zscore_mask(arr, thr):
+    n, m = arr.shape
+    mu = np.zeros(m)
+    sd = np.zeros(m)
+    for j in prange(m):
+        for i in range(n):
+            mu[j] += arr[i, j]
+        mu[j] /= n
+        for i in range(n):
+            sd[j] += (arr[i, j] - mu[j]) ** 2
+        sd[j] = (sd[j] / (n - 1)) ** 0.5
+    mask = np.ones(n, dtype=np.bool_)
+    for i in prange(n):
+        for j in range(m):
+            if not abs((arr[i, j] - mu[j]) / sd[j]) < thr:
+                mask[i] = False
+                break
+    return mask
+
+# Load and clean the dataset, pick the correlation backend, compile the
+# z-score kernel and start the render pool
+def setup():
+    global cp, _xp, X, y, numerical_cols, pair_cols
+    try:
+        import cupy
+        cupy.cuda.runtime.getDeviceCount()
+        cp = _xp = cupy
+    except (ImportError, RuntimeError):
+        pass
+
+    # Extract features and targets
+    X, targets = load_dataset()
+    y = pd.Series(targets.iloc[:, 0], name='target', dtype='category')
+
+    numerical_cols = X.select_dtypes(include=[np.number]).columns
+
+    # Pair plots only cover the ten mean features (radius1 ... fractal_dimension1);
+    # a grid over all 30 columns is 900 panels and dominates the render time
+    pair_cols = [c for c in numerical_cols if c.endswith('1')]
+
+    # Initial cleaning runs once as a Polars lazy query; pandas is only used
+    # from here on, where the routes and plotting libraries consume X
+    X_pl = pl.from_pandas(X).lazy()
+    X_pl = X_pl.with_columns([pl.col(c).fill_null(pl.col(c).mean()) for c in numerical_cols])
+    X_pl = X_pl.unique(keep='first', maintain_order=True)
+    X = X_pl.collect().to_pandas()
+
+    zscore_mask.compile('b1[:](f4[:, ::1], f8)')
+
+    _mp_context.set_forkserver_preload(['plots'])
+    start_pool()
+
+# Return the cached figure for key, building it only on a cache miss; the
+# compression level only changes PNG output, so it is only keyed for PNGs
+def cached(key, builder, mimetype):
+    key = f"{key}:{_data_version[0]}"
+    if mimetype == 'image/png':
+        key = f"{key}:{png_compress_level()}"
+    if key not in _fig_cache:
+        _fig_cache[key] = builder()
+    return _fig_cache[key]
 
-numerical_cols = X.select_dtypes(include=[np.number]).columns
+# Figure builders served by /plot/<name>, with the mimetype of their output
+PLOTS = {}
 
-X[numerical_cols] = X[numerical_cols].fillna(X[numerical_cols].mean())
-X = X.drop_duplicates()
+def plot_builder(name, mimetype):
+    def register(builder):
+        PLOTS[name] = (builder, mimetype)
+        return builder
+    return register
 
-# Function to convert matplotlib figure to base64 for HTML rendering
-def fig_to_base64(fig):
-    img = BytesIO()
-    fig.savefig(img, format='png')
-    img.seek(0)
-    return base64.b64encode(img.getvalue()).decode()
+# Page embedding the /plot image for name, forwarding ?fast=1
+def figure_page(name):
+    return render_template('figure.html', src=url_for('plot', name=name, fast=request.args.get('fast')))
+
+# Mark X as changed so figures and X_no_outliers are rebuilt on next use
+def invalidate():
+    _data_version[0] += 1
+    _fig_cache.clear()
+
+def refresh_numeric():
+    if _X_num_version[0] != _data_version[0]:
+        _X_num[0] = X[numerical_cols]
+        _X_num_arr[0] = np.ascontiguousarray(_X_num[0].to_numpy(dtype=np.float32))
+        _X_num_version[0] = _data_version[0]
+
+def numeric_view():
+    refresh_numeric()
+    return _X_num[0]
+
+def numeric_array():
+    refresh_numeric()
+    return _X_num_arr[0]
+
+# X_no_outliers is only needed by /outlier_removal and the *_no_outliers
+# figures, so it is computed on demand and reused until X changes
+def ensure_no_outliers():
+    if _outliers_version[0] != _data_version[0]:
+        remove_outliers()
+        _outliers_version[0] = _data_version[0]
 
 def remove_outliers():
     global X_no_outliers
-    numeric_X = X.select_dtypes(include=[np.number])
-    z_scores = np.abs((numeric_X - numeric_X.mean()) / numeric_X.std())
-
-    outliers=np.where(z_scores>3)
-    X_no_outliers = numeric_X[(z_scores<3).all(axis=1)]
+    numeric_X = numeric_view()
+    X_no_outliers = numeric_X.iloc[zscore_mask(numeric_array(), 3.0)]
 
 # Routes for each step in the EDA process
 @app.route('/')
@@ -70,16 +242,36 @@ def home():
     </html>
     """
 
-# Route for checking missing values
-@app.before_request
-def before_request():
-    remove_outliers()
+# Cell text for one column of /show_all_data. Floats are formatted the way
+# to_html does: the same number of decimals down the column, with trailing
+# zeros common to every value trimmed down to one decimal
+def format_column(col):
+    if not pd.api.types.is_float_dtype(col):
+        return [escape(str(v)) for v in col]
+    missing = col.isna().to_numpy()
+    text = [f"{v:.6f}" for v in col.to_numpy(dtype=np.float64)]
+    trim = min([len(t) - len(t.rstrip('0')) for t, m in zip(text, missing) if not m] + [5])
+    return ['NaN' if m else t[:len(t) - trim] for t, m in zip(text, missing)]
 
 # Route to show all data
 @app.route('/show_all_data')
 def show_all_data():
-    global X
-    return f"<html><body>{X.to_html()}</body></html>"
+    frame = X
+
+    # Stream one table in row batches instead of building one large string;
+    # the cells are formatted once per column up front so every batch matches
+    def generate():
+        cells = [format_column(frame[c]) for c in frame.columns]
+        index = [escape(str(i)) for i in frame.index]
+        head = "".join(f"<th>{escape(str(c))}</th>" for c in frame.columns)
+        yield ('<html><body><table border="1" class="dataframe"><thead>'
+               f'<tr style="text-align: right;"><th></th>{head}</tr></thead><tbody>')
+        for i in range(0, len(frame), 200):
+            yield "".join(f"<tr><th>{index[r]}</th>" + "".join(f"<td>{col[r]}</td>" for col in cells) + "</tr>\n"
+                          for r in range(i, min(i + 200, len(frame))))
+        yield "</tbody></table></body></html>"
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
 
 @app.route('/missing_values')
 def missing_values():
@@ -89,120 +281,132 @@ def missing_values():
 # Route for handling missing values
 @app.route('/handle_missing_values')
 def handle_missing_values():
-    X[numerical_cols] = X[numerical_cols].fillna(X[numerical_cols].mean())
+    arr = X[numerical_cols].to_numpy(copy=True)
+    mu = np.nanmean(arr, axis=0)
+    inds = np.where(np.isnan(arr))
+    if inds[0].size:
+        arr[inds] = np.take(mu, inds[1])
+        X[numerical_cols] = arr
+        invalidate()
     return "<html><body><p>Missing values handled</p></body></html>"
 
 # Route for removing duplicates
 @app.route('/remove_duplicates')
 def remove_duplicates():
     global X
-    original_duplicates_count = X.duplicated().sum()
-    X_no_duplicates = X.drop_duplicates()
-    html_table = X_no_duplicates.to_html()
-    X = X.drop_duplicates()
+    mask = X.duplicated(keep='first')
+    original_duplicates_count = int(mask.sum())
+    if original_duplicates_count:
+        X = X.loc[~mask]
+        invalidate()
     return "<html><body><p>Duplicates removed</p></body></html>"
 
+# Route serving the encoded figure bytes for each plot
+@app.route('/plot/<name>')
+def plot(name):
+    if name not in PLOTS:
+        abort(404)
+    builder, mimetype = PLOTS[name]
+    return Response(cached(name, builder, mimetype), mimetype=mimetype)
+
 # Route for univariate analysis - Histograms
 @app.route('/univariate_histogram')
 def univariate_histogram():
-    fig, ax = plt.subplots(figsize=(12, 8))
-    X.hist(ax=ax)
-    plt.suptitle('Histograms of Numerical Variables')
-    img = fig_to_base64(fig)
-    return render_template('figure.html', image=img)
+    return figure_page('univariate_histogram')
+
+@plot_builder('univariate_histogram', 'image/jpeg')
+def build_univariate_histogram():
+    return render(render_histogram, 'univariate_histogram', X, 'Histograms of Numerical Variables')
 
 # Route for univariate analysis - Box Plots
 @app.route('/univariate_boxplot')
 def univariate_boxplot():
-    fig, ax = plt.subplots(figsize=(12, 8))
-    sns.boxplot(data=X, ax=ax)
-    plt.title('Box Plots of Numerical Variables')
-    img = fig_to_base64(fig)
-    return render_template('figure.html', image=img)
+    return figure_page('univariate_boxplot')
+
+@plot_builder('univariate_boxplot', 'image/jpeg')
+def build_univariate_boxplot():
+    return render(render_boxplot, 'univariate_boxplot', X, 'Box Plots of Numerical Variables')
 
 # Route for bivariate analysis - Scatter Plots
 @app.route('/bivariate_scatterplot')
 def bivariate_scatterplot():
-    fig, ax = plt.subplots(figsize=(12, 8))
-
-    # Create scatter plot for each pair of numerical variables
-    for i, col1 in enumerate(numerical_cols):
-        for j, col2 in enumerate(numerical_cols):
-            if i < j:
-                ax.scatter(X[col1], X[col2], label=f'{col1} vs {col2}')
+    return figure_page('bivariate_scatterplot')
 
-    ax.set_title('Bivariate Scatter Plots')
-    ax.legend()
-    img = fig_to_base64(fig)
-    return render_template('figure.html', image=img)
+@plot_builder('bivariate_scatterplot', 'image/jpeg')
+def build_bivariate_scatterplot():
+    # Density of every pair of mean features
+    return render(render_pairs, 'bivariate_scatterplot', numeric_view()[pair_cols], 'Bivariate Scatter Plots')
 
 # Route for correlation matrix
 @app.route('/correlation_matrix')
 def correlation_matrix():
-    numeric_X = X.select_dtypes(include=[np.number])
-    correlation_matrix = numeric_X.corr()
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', fmt=".2f")
-    plt.title('Correlation Matrix')
-    img = fig_to_base64(plt)
-    return render_template('figure.html', image=img)
+    return figure_page('correlation_matrix')
+
+@plot_builder('correlation_matrix', 'image/png')
+def build_correlation_matrix():
+    numeric_X = numeric_view()
+    corr = fast_corr(numeric_array())
+    correlation_matrix = pd.DataFrame(corr, index=numeric_X.columns, columns=numeric_X.columns)
+    return render(render_correlation, 'correlation_matrix', correlation_matrix, 'Correlation Matrix', png_compress_level())
 
 # Route for outlier detection and removal
 @app.route('/outlier_removal')
 def outlier_removal():
-    global X_no_outliers
-    numeric_X = X.select_dtypes(include=[np.number])
-    z_scores = np.abs((numeric_X - numeric_X.mean()) / numeric_X.std())
-    outliers = np.where(z_scores > 3)
-    X_no_outliers = numeric_X[(z_scores < 3).all(axis=1)]
+    ensure_no_outliers()
 
     # Display the removed outliers
-    removed_outliers_count = numeric_X.shape[0] - X_no_outliers.shape[0]
+    removed_outliers_count = X.shape[0] - X_no_outliers.shape[0]
     return f"<html><body><p>Number of outliers removed: {removed_outliers_count}</p></body></html>"
 
 # Route for univariate analysis after handling outliers - Histograms
 @app.route('/univariate_histogram_no_outliers')
 def univariate_histogram_no_outliers():
-    fig, ax = plt.subplots(figsize=(12, 8))
-    X_no_outliers.hist(ax=ax)
-    plt.suptitle('Histograms of Numerical Variables (Outliers Removed)')
-    img = fig_to_base64(fig)
-    return render_template('figure.html', image=img)
+    return figure_page('univariate_histogram_no_outliers')
+
+@plot_builder('univariate_histogram_no_outliers', 'image/jpeg')
+def build_univariate_histogram_no_outliers():
+    ensure_no_outliers()
+    return render(render_histogram, 'univariate_histogram_no_outliers', X_no_outliers, 'Histograms of Numerical Variables (Outliers Removed)')
 
 # Route for univariate analysis after handling outliers - Box Plots
 @app.route('/univariate_boxplot_no_outliers')
 def univariate_boxplot_no_outliers():
-    fig, ax = plt.subplots(figsize=(12, 8))
-    sns.boxplot(data=X_no_outliers, ax=ax)
-    plt.title('Box Plots of Numerical Variables (Outliers Removed)')
-    img = fig_to_base64(fig)
-    return render_template('figure.html', image=img)
+    return figure_page('univariate_boxplot_no_outliers')
+
+@plot_builder('univariate_boxplot_no_outliers', 'image/jpeg')
+def build_univariate_boxplot_no_outliers():
+    ensure_no_outliers()
+    return render(render_boxplot, 'univariate_boxplot_no_outliers', X_no_outliers, 'Box Plots of Numerical Variables (Outliers Removed)')
 
 # Route for bivariate analysis after handling outliers - Scatter Plots
 @app.route('/bivariate_scatterplot_no_outliers')
 def bivariate_scatterplot_no_outliers():
-    fig, ax = plt.subplots(figsize=(12, 8))
-
-    # Create scatter plot for each pair of numerical variables after outlier removal
-    for i, col1 in enumerate(numerical_cols):
-        for j, col2 in enumerate(numerical_cols):
-            if i < j:
-                ax.scatter(X_no_outliers[col1], X_no_outliers[col2], label=f'{col1} vs {col2}')
+    return figure_page('bivariate_scatterplot_no_outliers')
 
-    ax.set_title('Bivariate Scatter Plots (Outliers Removed)')
-    ax.legend()
-    img = fig_to_base64(fig)
-    return render_template('figure.html', image=img)
+@plot_builder('bivariate_scatterplot_no_outliers', 'image/jpeg')
+def build_bivariate_scatterplot_no_outliers():
+    ensure_no_outliers()
+    # Density of every pair of mean features after outlier removal
+    return render(render_pairs, 'bivariate_scatterplot_no_outliers', X_no_outliers[pair_cols], 'Bivariate Scatter Plots (Outliers Removed)')
 
 # Route for correlation matrix after handling outliers
 @app.route('/correlation_matrix_no_outliers')
 def correlation_matrix_no_outliers():
-    correlation_matrix_no_outliers = X_no_outliers.corr()
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(correlation_matrix_no_outliers, annot=True, cmap='coolwarm', fmt=".2f")
-    plt.title('Correlation Matrix (Outliers Removed)')
-    img = fig_to_base64(plt)
-    return render_template('figure.html', image=img)
+    return figure_page('correlation_matrix_no_outliers')
+
+@plot_builder('correlation_matrix_no_outliers', 'image/png')
+def build_correlation_matrix_no_outliers():
+    ensure_no_outliers()
+    corr = fast_corr(X_no_outliers.to_numpy(dtype=np.float32, copy=False))
+    correlation_matrix_no_outliers = pd.DataFrame(corr, index=X_no_outliers.columns, columns=X_no_outliers.columns)
+    return render(render_correlation, 'correlation_matrix_no_outliers', correlation_matrix_no_outliers, 'Correlation Matrix (Outliers Removed)', png_compress_level())
+
+# Render workers import this file again, as __mp_main__ when it is run as a
+# script or under its own name when the main script imports it. They only
+# need plots, so only the main process runs the setup above (a worker is
+# already renamed when it imports the main script)
+if multiprocessing.current_process().name == 'MainProcess':
+    setup()
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,122 @@
+# Figure rendering for the EDA app. This module runs in the render worker
+# processes, so it must not import app or anything with import-time work
+
+from io import BytesIO
+from contextlib import contextmanager
+import numpy as np
+import pyarrow as pa
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+import seaborn as sns
+
+# One reusable figure per route in each worker; a worker runs one render at
+# a time, so a figure is never shared between two renders
+_figs = {}
+
+# Function to encode a matplotlib figure for the /plot route; JPEG encodes
+# much faster than PNG and is fine for on-screen plots, PNG is kept for
+# figures with small text that JPEG artifacts would blur
+def fig_to_bytes(fig, fmt='jpeg', quality=80, compress_level=1):
+    img = BytesIO()
+    if fmt == 'png':
+        pil_kwargs = {'compress_level': compress_level}
+    else:
+        pil_kwargs = {'quality': quality, 'optimize': False}
+    fig.savefig(img, format=fmt, pil_kwargs=pil_kwargs, bbox_inches=None, dpi=90)
+    return img.getvalue()
+
+# Hold the pooled figure for key, cleared and resized to size. Figures are
+# created without pyplot so they are never kept in its global registry
+@contextmanager
+def pooled_fig(key, size=(12, 8)):
+    fig = _figs.get(key)
+    if fig is None:
+        fig = Figure(figsize=size)
+        _figs[key] = fig
+    else:
+        fig.set_size_inches(size)
+    fig.clf()
+    yield fig
+
+# Hold the pooled figure for key with a single subplot
+@contextmanager
+def get_fig(key, size=(12, 8)):
+    with pooled_fig(key, size) as fig:
+        yield fig, fig.add_subplot(111)
+
+# Draw a correlation heatmap as a single image; only strong correlations are
+# annotated, since a text artist per cell dominates the render time
+def plot_correlation(fig, ax, corr):
+    cv = corr.to_numpy()
+    im = ax.imshow(cv, cmap='coolwarm', vmin=-1, vmax=1)
+    fig.colorbar(im, ax=ax)
+    ax.set_xticks(range(len(corr)))
+    ax.set_xticklabels(corr.columns, rotation=90)
+    ax.set_yticks(range(len(corr)))
+    ax.set_yticklabels(corr.columns)
+    for i, j in zip(*np.where(np.abs(cv) > 0.7)):
+        ax.text(j, i, f"{cv[i, j]:.2f}", ha='center', va='center', fontsize=7)
+
+# Draw a pair grid of frame's columns: histograms on the diagonal and hexbin
+# densities elsewhere, so the cost per panel does not grow with the row count
+def plot_pairs(fig, frame):
+    vals = frame.to_numpy(dtype=np.float32)
+    k = vals.shape[1]
+    axes = fig.subplots(k, k, squeeze=False)
+    fig.subplots_adjust(left=0.15, bottom=0.15, right=0.98, top=0.94, wspace=0.05, hspace=0.05)
+    for i in range(k):
+        for j in range(k):
+            ax = axes[i, j]
+            if i == j:
+                ax.hist(vals[:, i], bins=20)
+            else:
+                ax.hexbin(vals[:, j], vals[:, i], gridsize=20, mincnt=1)
+            ax.set_xticks([])
+            ax.set_yticks([])
+            if i == k - 1:
+                ax.set_xlabel(frame.columns[j], rotation=90, fontsize=8)
+            if j == 0:
+                ax.set_ylabel(frame.columns[i], rotation=0, ha='right', fontsize=8)
+
+# Frames are passed to the render workers as Arrow IPC streams
+def to_ipc(frame):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def from_ipc(payload):
+    return pa.ipc.open_stream(payload).read_all().to_pandas()
+
+# Figure renderers run in the worker processes and return the encoded image bytes
+def render_histogram(key, payload, title):
+    frame = from_ipc(payload)
+    with get_fig(key) as (fig, ax):
+        frame.hist(ax=ax)
+        fig.suptitle(title)
+        return fig_to_bytes(fig)
+
+def render_boxplot(key, payload, title):
+    frame = from_ipc(payload)
+    with get_fig(key) as (fig, ax):
+        sns.boxplot(data=frame, ax=ax)
+        ax.set_title(title)
+        return fig_to_bytes(fig)
+
+# The pair grid gets about 1.3 in per panel so each panel stays legible
+def render_pairs(key, payload, title):
+    frame = from_ipc(payload)
+    k = frame.shape[1]
+    with pooled_fig(key, size=(1.3 * k, 1.3 * k)) as fig:
+        plot_pairs(fig, frame)
+        fig.suptitle(title)
+        return fig_to_bytes(fig)
+
+def render_correlation(key, payload, title, compress_level):
+    corr = from_ipc(payload)
+    with get_fig(key) as (fig, ax):
+        plot_correlation(fig, ax, corr)
+        ax.set_title(title)
+        return fig_to_bytes(fig, fmt='png', compress_level=compress_level)